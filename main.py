@@ -6,12 +6,68 @@ import sys
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QPushButton, QComboBox,
                              QVBoxLayout, QWidget, QFileDialog, QMessageBox, QSlider, QHBoxLayout,
                              QAction, QToolBar, QDialog, QLineEdit, QGridLayout, QFrame, QSpinBox,
-                             QGraphicsOpacityEffect)
+                             QGraphicsOpacityEffect, QCheckBox)
 from PyQt5.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve
 from PyQt5.QtGui import QIcon, QFont
 from pymediainfo import MediaInfo
 import ctypes
-from ctypes import POINTER, WINFUNCTYPE, c_bool, c_byte, c_char_p
+from ctypes import POINTER, WINFUNCTYPE, c_bool, c_byte, c_char_p, c_size_t, c_ulong
+from ctypes import wintypes
+from telemetry import SessionRecorder, PositionSampler, EVENT_SPAWN, EVENT_QUIT_SENT, EVENT_CONNECT_FAILED
+
+# Launch arguments per profile for the master instance (video and first audio track)
+# and the audio-only follower instances. Both roles must use the same caching, as it
+# sets the playback delay of each instance and would otherwise offset the tracks.
+VLC_PROFILES = {
+    "Default": {
+        "master": ["--fullscreen"],
+        "follower": ["--novideo"],
+    },
+    "Balanced": {
+        "master": ["--fullscreen", "--file-caching=1000", "--no-sub-autodetect-file", "--no-osd",
+                   "--no-stats", "--no-media-library", "--no-metadata-network-access"],
+        "follower": ["--novideo", "--no-spu", "--file-caching=1000", "--no-audio-time-stretch",
+                     "--no-sub-autodetect-file", "--no-osd", "--no-stats", "--no-media-library",
+                     "--no-metadata-network-access"],
+    },
+    "Low resources": {
+        "master": ["--fullscreen", "--file-caching=600", "--avcodec-threads=2", "--no-spu",
+                   "--no-sub-autodetect-file", "--no-osd", "--no-stats", "--no-media-library",
+                   "--no-metadata-network-access", "--no-auto-preparse"],
+        "follower": ["--novideo", "--no-spu", "--file-caching=600", "--no-audio-time-stretch",
+                     "--no-sub-autodetect-file", "--no-osd", "--no-stats", "--no-media-library",
+                     "--no-metadata-network-access", "--no-auto-preparse"],
+    },
+}
+
+PROCESS_QUERY_INFORMATION = 0x0400
+PROCESS_VM_READ = 0x0010
+
+
+class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+    _fields_ = [("cb", c_ulong),
+                ("PageFaultCount", c_ulong),
+                ("PeakWorkingSetSize", c_size_t),
+                ("WorkingSetSize", c_size_t),
+                ("QuotaPeakPagedPoolUsage", c_size_t),
+                ("QuotaPagedPoolUsage", c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", c_size_t),
+                ("QuotaNonPagedPoolUsage", c_size_t),
+                ("PagefileUsage", c_size_t),
+                ("PeakPagefileUsage", c_size_t)]
+
+
+if sys.platform == "win32":
+    kernel32 = ctypes.WinDLL("kernel32")
+    psapi = ctypes.WinDLL("psapi")
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    kernel32.GetProcessTimes.restype = wintypes.BOOL
+    kernel32.GetProcessTimes.argtypes = [wintypes.HANDLE] + [POINTER(wintypes.FILETIME)] * 4
+    kernel32.CloseHandle.restype = wintypes.BOOL
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
 
 class MultitracksVLC(QMainWindow):
     def __init__(self):
@@ -25,8 +81,18 @@ class MultitracksVLC(QMainWindow):
         self.vlc_path = r"C:\Program Files (x86)\VideoLAN\VLC\vlc.exe"
         self.num_tracks = 2
         self.video_started = False
+        self.record_telemetry = False
+        self.recorder = None
+        self.position_sampler = None
+        self.vlc_processes = []
+        self.vlc_profile = "Default"
+        self.measure_resources = False
+        self.resource_samples = {}
+        self.last_cpu_times = {}
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_playback_time)
+        self.resource_timer = QTimer(self)
+        self.resource_timer.timeout.connect(self.sample_resources)
         self.initUI()
 
     def initUI(self):
@@ -106,6 +172,10 @@ class MultitracksVLC(QMainWindow):
         settings_action.triggered.connect(self.open_settings)
         self.toolbar.addAction(settings_action)
 
+        resource_usage_action = QAction("Resource Usage", self)
+        resource_usage_action.triggered.connect(self.show_resource_usage)
+        self.toolbar.addAction(resource_usage_action)
+
     def create_vertical_separation_line(self):
         """
         Create a vertical separation line.
@@ -128,12 +198,17 @@ class MultitracksVLC(QMainWindow):
 
     def open_settings(self):
         """
-        Open the settings dialog to change the VLC path and number of tracks.
+        Open the settings dialog to change the VLC path, number of tracks, launch profile,
+        telemetry recording and resource measurement.
         """
-        settings_dialog = SettingsDialog(self.vlc_path, self.num_tracks, self)
+        settings_dialog = SettingsDialog(self.vlc_path, self.num_tracks, self.record_telemetry,
+                                         self.vlc_profile, self.measure_resources, self)
         if settings_dialog.exec_() == QDialog.Accepted:
             self.vlc_path = settings_dialog.get_vlc_path()
             self.num_tracks = settings_dialog.get_num_tracks()
+            self.record_telemetry = settings_dialog.get_record_telemetry()
+            self.vlc_profile = settings_dialog.get_vlc_profile()
+            self.measure_resources = settings_dialog.get_measure_resources()
             self.update_audio_layouts()
 
     def select_video(self):
@@ -173,13 +248,29 @@ class MultitracksVLC(QMainWindow):
             return
 
         try:
+            if self.record_telemetry:
+                self.start_recorder()
             self.start_vlc_instances(self.video_file, audio_tracks, device_guids)
             for port in range(4212, 4212 + self.num_tracks):
                 self.send_command("localhost", port, "play")
             self.show_playback_controls()
             self.video_started = True
             self.timer.start(1000)
+            if self.recorder:
+                self.position_sampler = PositionSampler(
+                    self.recorder, "localhost", range(4212, 4212 + self.num_tracks),
+                    {4212 + i: process for i, process in enumerate(self.vlc_processes)})
+                self.position_sampler.start()
+            if self.measure_resources:
+                self.resource_samples = {}
+                self.last_cpu_times = {}
+                self.resource_timer.start(1000)
         except Exception as e:
+            if self.position_sampler:
+                self.position_sampler.stop()
+                self.position_sampler = None
+            if self.recorder:
+                self.stop_recorder()
             QMessageBox.critical(self, "Error", f"An error occurred: {e}")
 
     def update_playback_time(self):
@@ -195,6 +286,104 @@ class MultitracksVLC(QMainWindow):
             self.seek_bar.blockSignals(False)
             self.time_label.setText(self.format_time(current_time))
 
+    def start_recorder(self):
+        """
+        Start recording session telemetry to a new log in the sessions folder.
+        """
+        os.makedirs("sessions", exist_ok=True)
+        log_name = time.strftime("session-%Y%m%d-%H%M%S")
+        log_path = os.path.join("sessions", f"{log_name}.mtl")
+        suffix = 1
+        while os.path.exists(log_path):
+            suffix += 1
+            log_path = os.path.join("sessions", f"{log_name}-{suffix}.mtl")
+        self.recorder = SessionRecorder(log_path)
+
+    def stop_recorder(self):
+        """
+        Stop recording session telemetry and report if the log could not be fully written.
+        """
+        try:
+            self.recorder.close()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"The session log {self.recorder.path} is incomplete: {e}")
+        self.recorder = None
+
+    def sample_resources(self):
+        """
+        Sample the memory and CPU usage of each running VLC instance.
+        """
+        for i, process in enumerate(self.vlc_processes):
+            if process.poll() is not None:
+                continue
+            usage = self.get_process_usage(process.pid)
+            if usage is None:
+                continue
+            rss, cpu_time = usage
+            now = time.monotonic()
+            port = 4212 + i
+            if port in self.last_cpu_times:
+                last_now, last_cpu_time = self.last_cpu_times[port]
+                cpu_percent = (cpu_time - last_cpu_time) / (now - last_now) * 100
+                self.resource_samples.setdefault(port, []).append((rss, cpu_percent))
+                if self.recorder:
+                    self.recorder.resource(port, rss, cpu_percent)
+            self.last_cpu_times[port] = (now, cpu_time)
+
+    def get_process_usage(self, pid):
+        """
+        Get the resident memory and total CPU time of a process.
+
+        Args:
+            pid (int): Process id.
+
+        Returns:
+            tuple: Working set size in bytes and CPU time in seconds, or None if failed.
+        """
+        handle = kernel32.OpenProcess(PROCESS_QUERY_INFORMATION | PROCESS_VM_READ, False, pid)
+        if not handle:
+            return None
+        try:
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            if not psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return None
+            creation, exit_time, kernel, user = (wintypes.FILETIME(), wintypes.FILETIME(),
+                                                 wintypes.FILETIME(), wintypes.FILETIME())
+            if not kernel32.GetProcessTimes(handle, ctypes.byref(creation), ctypes.byref(exit_time),
+                                            ctypes.byref(kernel), ctypes.byref(user)):
+                return None
+            cpu_time = sum((t.dwHighDateTime << 32) | t.dwLowDateTime for t in (kernel, user))
+            return counters.WorkingSetSize, cpu_time / 1e7
+        finally:
+            kernel32.CloseHandle(handle)
+
+    def show_resource_usage(self):
+        """
+        Show the measured memory and CPU usage of each VLC instance.
+        """
+        if not self.resource_samples:
+            QMessageBox.information(self, "Resource Usage",
+                                    "No measurements yet. Enable resource measurement in the settings "
+                                    "and start a video.")
+            return
+        lines = [f"Profile: {self.vlc_profile}", ""]
+        total_peak_rss = 0
+        total_cpu = 0
+        for port, samples in sorted(self.resource_samples.items()):
+            peak_rss = max(rss for rss, _ in samples)
+            average_rss = sum(rss for rss, _ in samples) / len(samples)
+            average_cpu = sum(cpu for _, cpu in samples) / len(samples)
+            total_peak_rss += peak_rss
+            total_cpu += average_cpu
+            role = "master" if port == 4212 else "follower"
+            lines.append(f"Track {port - 4211} ({role}): RSS {average_rss / 2 ** 20:.1f} MB avg, "
+                         f"{peak_rss / 2 ** 20:.1f} MB peak, CPU {average_cpu:.1f}% avg")
+        lines.append("")
+        lines.append(f"Total: {total_peak_rss / 2 ** 20:.1f} MB peak, CPU {total_cpu:.1f}% avg "
+                     f"(100% = one core, {os.cpu_count()} cores)")
+        QMessageBox.information(self, "Resource Usage", "\n".join(lines))
+
     def get_current_time(self, host, port):
         """
         Get the current playback time from VLC.
@@ -258,8 +447,24 @@ class MultitracksVLC(QMainWindow):
         """
         if self.video_started:
             self.timer.stop()
+            self.resource_timer.stop()
+            if self.position_sampler:
+                self.position_sampler.stop()
             for port in range(4212, 4212 + self.num_tracks):
                 self.send_command("localhost", port, "quit", is_quit=True)
+                if self.recorder and port - 4212 < len(self.vlc_processes):
+                    self.recorder.lifecycle(port, EVENT_QUIT_SENT, self.vlc_processes[port - 4212].pid)
+            if self.position_sampler:
+                deadline = time.monotonic() + 2
+                for process in self.vlc_processes:
+                    try:
+                        process.wait(max(0, deadline - time.monotonic()))
+                    except subprocess.TimeoutExpired:
+                        pass
+                self.position_sampler.check_exits()
+                self.position_sampler = None
+        if self.recorder:
+            self.stop_recorder()
         QApplication.quit()
 
     def closeEvent(self, event):
@@ -392,7 +597,8 @@ class MultitracksVLC(QMainWindow):
 
     def start_vlc_instances(self, video_file, audio_tracks, device_guids):
         """
-        Start multiple VLC instances with specified audio tracks and devices.
+        Start multiple VLC instances with specified audio tracks and devices, using the
+        master and follower arguments of the selected launch profile.
 
         Args:
             video_file (str): Path to the video file.
@@ -400,6 +606,8 @@ class MultitracksVLC(QMainWindow):
             device_guids (list): List of GUIDs of the audio devices.
         """
         video_file = os.path.abspath(video_file)
+        profile = VLC_PROFILES[self.vlc_profile]
+        self.vlc_processes = []
         for i, (audio_track, device_guid) in enumerate(zip(audio_tracks, device_guids)):
             vlc_cmd = [
                 self.vlc_path,
@@ -410,10 +618,12 @@ class MultitracksVLC(QMainWindow):
                 "--no-video-title-show",
                 f"--rc-host=localhost:{4212 + i}",
                 "--extraintf=rc",
-                "--intf=dummy",
-                "--fullscreen" if i == 0 else "--novideo"
-            ]
-            subprocess.Popen(vlc_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                "--intf=dummy"
+            ] + profile["master" if i == 0 else "follower"]
+            process = subprocess.Popen(vlc_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.vlc_processes.append(process)
+            if self.recorder:
+                self.recorder.lifecycle(4212 + i, EVENT_SPAWN, process.pid)
         time.sleep(2)
 
     def send_command(self, host, port, command, is_quit=False):
@@ -426,12 +636,18 @@ class MultitracksVLC(QMainWindow):
             command (str): Command to send.
             is_quit (bool): Whether the command is part of the quit process.
         """
+        sent = self.recorder.now() if self.recorder else None
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                 s.connect((host, port))
                 s.sendall(f"{command}\n".encode())
+                if self.recorder:
+                    self.recorder.command(port, command, sent, self.recorder.now())
                 time.sleep(0.1)
         except ConnectionRefusedError:
+            if self.recorder:
+                self.recorder.command(port, command, sent)
+                self.recorder.lifecycle(port, EVENT_CONNECT_FAILED)
             if not is_quit:
                 QMessageBox.critical(None, "Error", f"Unable to connect to {host}:{port}")
 
@@ -597,18 +813,25 @@ class MultitracksVLC(QMainWindow):
                 self.clear_layout(item.layout())
 
 class SettingsDialog(QDialog):
-    def __init__(self, vlc_path, num_tracks, parent=None):
+    def __init__(self, vlc_path, num_tracks, record_telemetry=False, vlc_profile="Default",
+                 measure_resources=False, parent=None):
         """
         Initialize the settings dialog.
 
         Args:
             vlc_path (str): Path to the VLC executable.
             num_tracks (int): Number of audio tracks.
+            record_telemetry (bool): Whether session telemetry is recorded.
+            vlc_profile (str): Name of the VLC launch profile.
+            measure_resources (bool): Whether the resource usage of VLC instances is measured.
             parent (QWidget): Parent widget.
         """
         super().__init__(parent)
         self.vlc_path = vlc_path
         self.num_tracks = num_tracks
+        self.record_telemetry = record_telemetry
+        self.vlc_profile = vlc_profile
+        self.measure_resources = measure_resources
         self.initUI()
 
     def initUI(self):
@@ -638,6 +861,22 @@ class SettingsDialog(QDialog):
         self.num_tracks_input.setValue(self.num_tracks)
         layout.addWidget(self.num_tracks_input)
 
+        self.vlc_profile_label = QLabel("Launch Profile:")
+        layout.addWidget(self.vlc_profile_label)
+
+        self.vlc_profile_input = QComboBox()
+        self.vlc_profile_input.addItems(VLC_PROFILES.keys())
+        self.vlc_profile_input.setCurrentText(self.vlc_profile)
+        layout.addWidget(self.vlc_profile_input)
+
+        self.record_telemetry_input = QCheckBox("Record session telemetry")
+        self.record_telemetry_input.setChecked(self.record_telemetry)
+        layout.addWidget(self.record_telemetry_input)
+
+        self.measure_resources_input = QCheckBox("Measure resource usage")
+        self.measure_resources_input.setChecked(self.measure_resources)
+        layout.addWidget(self.measure_resources_input)
+
         self.save_btn = QPushButton("Save")
         self.save_btn.clicked.connect(self.accept)
         layout.addWidget(self.save_btn)
@@ -673,6 +912,33 @@ class SettingsDialog(QDialog):
         """
         return self.num_tracks_input.value()
 
+    def get_record_telemetry(self):
+        """
+        Get whether session telemetry should be recorded.
+
+        Returns:
+            bool: True if telemetry recording is enabled.
+        """
+        return self.record_telemetry_input.isChecked()
+
+    def get_vlc_profile(self):
+        """
+        Get the selected VLC launch profile.
+
+        Returns:
+            str: Name of the launch profile.
+        """
+        return self.vlc_profile_input.currentText()
+
+    def get_measure_resources(self):
+        """
+        Get whether the resource usage of VLC instances should be measured.
+
+        Returns:
+            bool: True if resource measurement is enabled.
+        """
+        return self.measure_resources_input.isChecked()
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MultitracksVLC()
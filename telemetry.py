@@ -0,0 +1,679 @@
+import argparse
+import math
+import os
+import queue
+import random
+import socket
+import socketserver
+import statistics
+import struct
+import sys
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+MAGIC = b"MTVLTEL1"
+HEADER = struct.Struct("<d")
+RECORD = struct.Struct("<BdH")
+COMMAND = struct.Struct("<dH")
+POSITION = struct.Struct("<i")
+LIFECYCLE = struct.Struct("<BIq")
+RESOURCE = struct.Struct("<Qf")
+
+KIND_COMMAND = 1
+KIND_POSITION = 2
+KIND_LIFECYCLE = 3
+KIND_RESOURCE = 4
+
+EVENT_SPAWN = 1
+EVENT_QUIT_SENT = 2
+EVENT_CONNECT_FAILED = 3
+EVENT_EXIT = 4
+EVENT_NAMES = {EVENT_SPAWN: "spawn", EVENT_QUIT_SENT: "quit_sent", EVENT_CONNECT_FAILED: "connect_failed",
+               EVENT_EXIT: "exit"}
+
+BASE_PORT = 4212
+
+CommandRecord = namedtuple("CommandRecord", "t port ack command")
+PositionRecord = namedtuple("PositionRecord", "t port position")
+LifecycleRecord = namedtuple("LifecycleRecord", "t port event pid code", defaults=(0,))
+ResourceRecord = namedtuple("ResourceRecord", "t port rss cpu")
+
+
+class SessionRecorder:
+    def __init__(self, path, flush_interval=1.0):
+        """
+        Open an append-only binary session log and start the writer thread.
+
+        Records are queued by the caller and packed and written by a background
+        thread, so recording never blocks the GUI on disk I/O.
+
+        Args:
+            path (str): Path to the log file, which must not exist yet.
+            flush_interval (float): Maximum seconds between flushes to disk.
+
+        Raises:
+            FileExistsError: If the log file already exists.
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.error = None
+        self._start = time.perf_counter()
+        self._queue = queue.SimpleQueue()
+        self._file = open(path, "xb")
+        self._file.write(MAGIC + HEADER.pack(time.time()))
+        self._thread = threading.Thread(target=self._run, name="SessionRecorder", daemon=True)
+        self._thread.start()
+
+    def now(self):
+        """
+        Get the current session timestamp.
+
+        Returns:
+            float: Seconds elapsed since the recorder was created.
+        """
+        return time.perf_counter() - self._start
+
+    def command(self, port, command, sent, ack=None):
+        """
+        Record an RC command.
+
+        Args:
+            port (int): RC port of the VLC instance.
+            command (str): Command sent.
+            sent (float): Session timestamp taken before connecting.
+            ack (float): Session timestamp once the command was delivered, or None if it failed.
+        """
+        self._put((KIND_COMMAND, sent, port, (math.nan if ack is None else ack, command)))
+
+    def position(self, port, position, t=None):
+        """
+        Record a playback position sample.
+
+        Args:
+            port (int): RC port of the VLC instance.
+            position (int): Playback position in seconds, or None if unavailable.
+            t (float): Session timestamp of the sample, defaults to now.
+        """
+        self._put((KIND_POSITION, self.now() if t is None else t, port,
+                         -1 if position is None else position))
+
+    def lifecycle(self, port, event, pid=0, code=0):
+        """
+        Record an instance lifecycle event.
+
+        Args:
+            port (int): RC port of the VLC instance.
+            event (int): One of the EVENT_* constants.
+            pid (int): Process id of the instance, if known.
+            code (int): Return code of the process, for EVENT_EXIT.
+        """
+        self._put((KIND_LIFECYCLE, self.now(), port, (event, pid, code)))
+
+    def resource(self, port, rss, cpu):
+        """
+        Record a resource usage sample of an instance.
+
+        Args:
+            port (int): RC port of the VLC instance.
+            rss (int): Resident memory in bytes.
+            cpu (float): CPU usage since the previous sample, in percent of one core.
+        """
+        self._put((KIND_RESOURCE, self.now(), port, (rss, cpu)))
+
+    def close(self):
+        """
+        Write out all pending records and close the log.
+
+        Raises:
+            Exception: The error that stopped the writer thread, if writing failed.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self._file.close()
+        except OSError as e:
+            self.error = self.error or e
+        if self.error:
+            raise self.error
+
+    def _put(self, item):
+        # Once the writer thread has failed, records are dropped instead of queued.
+        if self.error is None:
+            self._queue.put(item)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        running = True
+        while running:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                chunks = []
+                for item in items:
+                    if item is None:
+                        running = False
+                        break
+                    chunks.append(pack_record(*item))
+                self._file.write(b"".join(chunks))
+                if not running or time.monotonic() - last_flush >= self.flush_interval:
+                    self._file.flush()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                self.error = e
+                return
+
+
+class PositionSampler(threading.Thread):
+    def __init__(self, recorder, host, ports, processes=None, interval=1.0):
+        """
+        Poll the playback position of each instance in the background and record it.
+
+        Failed polls are recorded and never reported to the user, so a stalled
+        instance cannot block or interrupt the GUI. The time between rounds is
+        randomized around the interval so that samples fall at every point within
+        a second, which lets windowed_drift resolve offsets below one second.
+
+        Args:
+            recorder (SessionRecorder): Recorder for the samples.
+            host (str): Host address.
+            ports (list): RC ports of the instances to sample.
+            processes (dict): RC port mapped to the Popen of its instance, whose exits are recorded.
+            interval (float): Average seconds between sampling rounds.
+        """
+        super().__init__(name="PositionSampler", daemon=True)
+        self.recorder = recorder
+        self.host = host
+        self.ports = list(ports)
+        self.processes = processes or {}
+        self.interval = interval
+        self._exited = set()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval * random.uniform(0.5, 1.5)):
+            self.check_exits()
+            for port in self.ports:
+                sent = self.recorder.now()
+                position = query_time(self.host, port)
+                received = self.recorder.now()
+                if position is None:
+                    self.recorder.command(port, "get_time", sent)
+                else:
+                    self.recorder.command(port, "get_time", sent, received)
+                    self.recorder.position(port, position, received)
+
+    def check_exits(self):
+        """
+        Record the exit of every instance that has exited since the last check.
+        """
+        for port, process in self.processes.items():
+            if port not in self._exited and process.poll() is not None:
+                self._exited.add(port)
+                self.recorder.lifecycle(port, EVENT_EXIT, process.pid, process.returncode)
+
+    def stop(self):
+        """
+        Stop sampling and wait for the current round to finish.
+        """
+        self._stop_event.set()
+        self.join()
+
+
+def query_time(host, port, timeout=0.5):
+    """
+    Ask an RC interface for its playback position.
+
+    Args:
+        host (str): Host address.
+        port (int): Port number.
+        timeout (float): Socket timeout in seconds.
+
+    Returns:
+        int: Playback position in seconds, or None if failed.
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout)
+            s.connect((host, port))
+            s.sendall(b"get_time\n")
+            response = s.recv(1024).decode().strip()
+    except OSError:
+        return None
+    return int(response) if response.isdigit() else None
+
+
+def pack_record(kind, t, port, payload):
+    """
+    Encode a single record.
+
+    Args:
+        kind (int): One of the KIND_* constants.
+        t (float): Session timestamp.
+        port (int): RC port of the VLC instance.
+        payload: Kind-specific payload.
+
+    Returns:
+        bytes: The encoded record.
+    """
+    header = RECORD.pack(kind, t, port)
+    if kind == KIND_COMMAND:
+        ack, command = payload
+        data = command.encode()
+        return header + COMMAND.pack(ack, len(data)) + data
+    if kind == KIND_POSITION:
+        return header + POSITION.pack(payload)
+    if kind == KIND_RESOURCE:
+        return header + RESOURCE.pack(*payload)
+    return header + LIFECYCLE.pack(*payload)
+
+
+def read_log(path):
+    """
+    Read a session log. A truncated trailing record, left by a crash, is ignored.
+
+    Args:
+        path (str): Path to the log file.
+
+    Returns:
+        tuple: Wall-clock start time and list of records.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a session log")
+    offset = len(MAGIC)
+    (wall_start,) = HEADER.unpack_from(data, offset)
+    offset += HEADER.size
+    records = []
+    try:
+        while offset < len(data):
+            kind, t, port = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            if kind == KIND_COMMAND:
+                ack, length = COMMAND.unpack_from(data, offset)
+                offset += COMMAND.size
+                if offset + length > len(data):
+                    break
+                command = data[offset:offset + length].decode()
+                offset += length
+                records.append(CommandRecord(t, port, None if math.isnan(ack) else ack, command))
+            elif kind == KIND_POSITION:
+                (position,) = POSITION.unpack_from(data, offset)
+                offset += POSITION.size
+                records.append(PositionRecord(t, port, None if position < 0 else position))
+            elif kind == KIND_LIFECYCLE:
+                event, pid, code = LIFECYCLE.unpack_from(data, offset)
+                offset += LIFECYCLE.size
+                records.append(LifecycleRecord(t, port, event, pid, code))
+            elif kind == KIND_RESOURCE:
+                rss, cpu = RESOURCE.unpack_from(data, offset)
+                offset += RESOURCE.size
+                records.append(ResourceRecord(t, port, rss, cpu))
+            else:
+                raise ValueError(f"Unknown record kind {kind} at offset {offset - RECORD.size}")
+    except struct.error:
+        pass
+    return wall_start, records
+
+
+def drift_curves(records, master_port=BASE_PORT):
+    """
+    Reconstruct the drift of each follower track against the master track.
+
+    Each follower sample is compared with the latest master sample taken before it,
+    advanced by the time between the two samples while the master is playing.
+
+    Args:
+        records (list): Records returned by read_log.
+        master_port (int): RC port of the master instance.
+
+    Returns:
+        dict: Port mapped to a list of (timestamp, drift in seconds) tuples.
+    """
+    curves = defaultdict(list)
+    master_position = None
+    master_t = None
+    playing = False
+    for record in records:
+        if isinstance(record, CommandRecord) and record.port == master_port and record.ack is not None:
+            verb = record.command.split(" ", 1)[0]
+            if verb == "play":
+                playing = True
+            elif verb == "pause":
+                playing = not playing
+            elif verb == "quit":
+                playing = False
+        if not isinstance(record, PositionRecord) or record.position is None:
+            continue
+        if record.port == master_port:
+            master_position = record.position
+            master_t = record.t
+        elif master_position is not None:
+            expected = master_position + (record.t - master_t if playing else 0)
+            curves[record.port].append((record.t, record.position - expected))
+    return dict(curves)
+
+
+def windowed_drift(curve, window=30.0):
+    """
+    Average a drift curve over consecutive time windows.
+
+    VLC reports positions in whole seconds, so a single drift sample is only
+    accurate to one second. PositionSampler takes samples at random points within
+    each second, so their mean over a window recovers offsets below one second.
+
+    Args:
+        curve (list): (timestamp, drift) tuples returned by drift_curves.
+        window (float): Window length in seconds.
+
+    Returns:
+        list: (window start timestamp, mean drift in seconds, number of samples) tuples.
+    """
+    windows = []
+    start = None
+    drifts = []
+    for t, drift in curve:
+        if start is not None and t - start >= window:
+            windows.append((start, sum(drifts) / len(drifts), len(drifts)))
+            start = None
+            drifts = []
+        if start is None:
+            start = t
+        drifts.append(drift)
+    if drifts:
+        windows.append((start, sum(drifts) / len(drifts), len(drifts)))
+    return windows
+
+
+def latency_stats(records):
+    """
+    Compute RC command latency distributions, grouped by command verb.
+
+    Args:
+        records (list): Records returned by read_log.
+
+    Returns:
+        dict: Verb mapped to a dict with count, failed, min, median, p95 and max in milliseconds.
+    """
+    latencies = defaultdict(list)
+    failures = defaultdict(int)
+    for record in records:
+        if not isinstance(record, CommandRecord):
+            continue
+        verb = record.command.split(" ", 1)[0]
+        if record.ack is None:
+            failures[verb] += 1
+        else:
+            latencies[verb].append((record.ack - record.t) * 1000)
+    stats = {}
+    for verb in set(latencies) | set(failures):
+        values = sorted(latencies[verb])
+        stats[verb] = {
+            "count": len(values),
+            "failed": failures[verb],
+            "min": values[0] if values else None,
+            "median": statistics.median(values) if values else None,
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))] if values else None,
+            "max": values[-1] if values else None,
+        }
+    return stats
+
+
+def broadcast_spreads(records):
+    """
+    Measure how long each command broadcast took to reach every instance.
+
+    A broadcast is a run of consecutive records sending the same command to different ports.
+    Position polls, lifecycle events and resource samples in between are ignored.
+
+    Args:
+        records (list): Records returned by read_log.
+
+    Returns:
+        list: (timestamp, command, spread in milliseconds, failed ports) tuples. The spread runs
+        to the last delivered command and is None if none was delivered.
+    """
+    spreads = []
+    run = []
+    for record in records + [None]:
+        if isinstance(record, (PositionRecord, LifecycleRecord, ResourceRecord)) or (
+                isinstance(record, CommandRecord) and record.command == "get_time"):
+            continue
+        if (isinstance(record, CommandRecord) and run and record.command == run[0].command
+                and record.port not in {r.port for r in run}):
+            run.append(record)
+            continue
+        if len(run) > 1:
+            acks = [r.ack for r in run if r.ack is not None]
+            spread = (max(acks) - run[0].t) * 1000 if acks else None
+            spreads.append((run[0].t, run[0].command, spread, [r.port for r in run if r.ack is None]))
+        run = [record] if isinstance(record, CommandRecord) else []
+    return spreads
+
+
+def resource_stats(records):
+    """
+    Summarize the measured memory and CPU usage of each instance.
+
+    Args:
+        records (list): Records returned by read_log.
+
+    Returns:
+        dict: Port mapped to a dict with samples, average and peak RSS in bytes and average CPU percent.
+    """
+    samples = defaultdict(list)
+    for record in records:
+        if isinstance(record, ResourceRecord):
+            samples[record.port].append(record)
+    return {
+        port: {
+            "samples": len(values),
+            "rss_avg": sum(r.rss for r in values) / len(values),
+            "rss_peak": max(r.rss for r in values),
+            "cpu_avg": sum(r.cpu for r in values) / len(values),
+        }
+        for port, values in samples.items()
+    }
+
+
+class FakeRCServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="localhost", port=0):
+        """
+        Minimal stand-in for a VLC RC interface, used to replay sessions.
+
+        It understands play, pause, seek, get_time and quit, and keeps every
+        command it receives in `commands`.
+
+        Args:
+            host (str): Host address.
+            port (int): Port number, 0 to pick a free one.
+        """
+        super().__init__((host, port), FakeRCHandler)
+        self.commands = []
+        self.playing = False
+        self.position = 0.0
+        self.since = time.monotonic()
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def current_time(self):
+        """
+        Get the simulated playback position.
+
+        Returns:
+            int: Position in seconds.
+        """
+        with self.lock:
+            elapsed = time.monotonic() - self.since if self.playing else 0
+            return int(self.position + elapsed)
+
+    def handle_command(self, command):
+        """
+        Apply a command to the simulated player.
+
+        Args:
+            command (str): Command received.
+
+        Returns:
+            str: Response to send back, or None.
+        """
+        self.commands.append(command)
+        verb, _, argument = command.partition(" ")
+        if verb == "get_time":
+            return str(self.current_time())
+        with self.lock:
+            now = time.monotonic()
+            if self.playing:
+                self.position += now - self.since
+            self.since = now
+            if verb == "play":
+                self.playing = True
+            elif verb == "pause":
+                self.playing = not self.playing
+            elif verb == "seek" and argument.isdigit():
+                self.position = float(argument)
+            elif verb == "quit":
+                self.playing = False
+        return None
+
+
+class FakeRCHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            response = self.server.handle_command(line.decode().strip())
+            if response is not None:
+                self.wfile.write(f"{response}\n".encode())
+
+
+def replay(records, host="localhost", ports=None, speed=1.0):
+    """
+    Replay the recorded RC commands with their original timing.
+
+    Args:
+        records (list): Records returned by read_log.
+        host (str): Host address to replay against.
+        ports (dict): Recorded port mapped to the port to replay against, defaults to the same port.
+        speed (float): Playback speed factor for the recorded timing.
+
+    Returns:
+        list: Records of the replayed commands, with a position sample for each get_time reply.
+    """
+    ports = ports or {}
+    start = time.perf_counter()
+    replayed = []
+    for record in records:
+        if not isinstance(record, CommandRecord):
+            continue
+        delay = record.t / speed - (time.perf_counter() - start)
+        if delay > 0:
+            time.sleep(delay)
+        port = ports.get(record.port, record.port)
+        sent = time.perf_counter() - start
+        ack = None
+        response = None
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.settimeout(0.5)
+                s.connect((host, port))
+                s.sendall(f"{record.command}\n".encode())
+                if record.command == "get_time":
+                    response = s.recv(1024).decode().strip()
+                ack = time.perf_counter() - start
+        except OSError:
+            pass
+        replayed.append(CommandRecord(sent, record.port, ack, record.command))
+        if response is not None:
+            replayed.append(PositionRecord(ack, record.port, int(response) if response.isdigit() else None))
+    return replayed
+
+
+def print_summary(records):
+    """
+    Print latency distributions, broadcast spreads, drift and resource usage of a session.
+
+    Args:
+        records (list): Records to summarize.
+    """
+    print("Command latency (ms):")
+    for verb, stats in sorted(latency_stats(records).items()):
+        if stats["count"]:
+            print(f"  {verb:<10} n={stats['count']:<5} failed={stats['failed']:<3} "
+                  f"min={stats['min']:.1f} median={stats['median']:.1f} "
+                  f"p95={stats['p95']:.1f} max={stats['max']:.1f}")
+        else:
+            print(f"  {verb:<10} n=0     failed={stats['failed']}")
+
+    spreads = broadcast_spreads(records)
+    delivered = [s for s in spreads if not s[3]]
+    if delivered:
+        print("Slowest broadcasts (ms):")
+        for t, command, spread, _ in sorted(delivered, key=lambda s: s[2], reverse=True)[:5]:
+            print(f"  t={t:8.2f}s {command:<12} {spread:.1f}")
+    failed = [s for s in spreads if s[3]]
+    if failed:
+        print("Failed broadcasts (ms):")
+        for t, command, spread, failed_ports in failed:
+            tracks = ", ".join(str(port - BASE_PORT + 1) for port in failed_ports)
+            print(f"  t={t:8.2f}s {command:<12} {'-' if spread is None else f'{spread:.1f}'} "
+                  f"FAILED on track {tracks}")
+
+    for port, curve in sorted(drift_curves(records).items()):
+        windows = windowed_drift(curve)
+        startup, end = windows[0][1], windows[-1][1]
+        worst = max((mean for _, mean, _ in windows), key=abs)
+        print(f"Track {port - BASE_PORT + 1} drift (s, {len(windows)} x 30 s windows): "
+              f"startup={startup:.2f} end={end:.2f} change={end - startup:+.2f} worst={worst:.2f} "
+              f"samples={len(curve)}")
+
+    for port, stats in sorted(resource_stats(records).items()):
+        print(f"Track {port - BASE_PORT + 1} resources: RSS avg={stats['rss_avg'] / 2 ** 20:.1f} MB "
+              f"peak={stats['rss_peak'] / 2 ** 20:.1f} MB CPU avg={stats['cpu_avg']:.1f}% "
+              f"samples={stats['samples']}")
+
+    for record in records:
+        if isinstance(record, LifecycleRecord):
+            print(f"  t={record.t:8.2f}s track {record.port - BASE_PORT + 1} "
+                  f"{EVENT_NAMES.get(record.event, record.event)} pid={record.pid}"
+                  + (f" code={record.code}" if record.event == EVENT_EXIT else ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a Multitracks VLC session log.")
+    parser.add_argument("log", help="session log file")
+    parser.add_argument("--replay", action="store_true",
+                        help="replay the session against fake RC servers and summarize the replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor")
+    args = parser.parse_args(argv)
+
+    wall_start, records = read_log(args.log)
+    print(f"Session started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(wall_start))}, "
+          f"{len(records)} records")
+    print_summary(records)
+
+    if args.replay:
+        servers = {port: FakeRCServer() for port in sorted({r.port for r in records})}
+        try:
+            replayed = replay(records, ports={port: server.port for port, server in servers.items()},
+                              speed=args.speed)
+        finally:
+            for server in servers.values():
+                server.shutdown()
+                server.server_close()
+        print(f"Replayed {len(replayed)} commands against {os.path.basename(args.log)}:")
+        print_summary(replayed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import os
+import random
+import struct
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telemetry
+from telemetry import (CommandRecord, FakeRCServer, LifecycleRecord, PositionRecord, ResourceRecord,
+                       SessionRecorder, read_log, replay)
+
+
+def test_record_read_and_replay(tmp_path):
+    log_path = str(tmp_path / "session.mtl")
+    recorder = SessionRecorder(log_path)
+    recorder.lifecycle(4212, telemetry.EVENT_SPAWN, 100)
+    recorder.lifecycle(4213, telemetry.EVENT_SPAWN, 101)
+    recorder.command(4212, "play", 0.00, 0.01)
+    recorder.command(4213, "play", 0.01, 0.02)
+    recorder.command(4212, "get_time", 0.05, 0.06)
+    recorder.position(4212, 0, 0.06)
+    recorder.command(4213, "get_time", 0.06, 0.07)
+    recorder.position(4213, 0, 0.07)
+    recorder.command(4212, "seek 30", 0.10, 0.11)
+    recorder.command(4213, "seek 30", 0.11, None)
+    recorder.command(4212, "get_time", 0.15, 0.16)
+    recorder.position(4212, 30, 0.16)
+    recorder.command(4213, "get_time", 0.16, 0.17)
+    recorder.position(4213, 30, 0.17)
+    recorder.close()
+
+    wall_start, records = read_log(log_path)
+    assert wall_start > 0
+    assert len(records) == 14
+    assert records[0] == LifecycleRecord(records[0].t, 4212, telemetry.EVENT_SPAWN, 100)
+    assert CommandRecord(0.11, 4213, None, "seek 30") in records
+    assert PositionRecord(0.17, 4213, 30) in records
+
+    servers = {4212: FakeRCServer(), 4213: FakeRCServer()}
+    try:
+        replayed = replay(records, ports={port: server.port for port, server in servers.items()})
+    finally:
+        for server in servers.values():
+            server.shutdown()
+            server.server_close()
+
+    for server in servers.values():
+        assert server.commands == ["play", "get_time", "seek 30", "get_time"]
+    commands = [r for r in replayed if isinstance(r, CommandRecord)]
+    assert [(r.port, r.command) for r in commands] == [(r.port, r.command) for r in records
+                                                       if isinstance(r, CommandRecord)]
+    assert all(r.ack is not None for r in commands)
+    positions = [(r.port, r.position) for r in replayed if isinstance(r, PositionRecord)]
+    assert positions == [(4212, 0), (4213, 0), (4212, 30), (4213, 30)]
+    assert abs(telemetry.drift_curves(replayed)[4213][-1][1] - 0) < 0.1
+
+
+def test_read_log_ignores_truncated_record(tmp_path):
+    log_path = str(tmp_path / "session.mtl")
+    recorder = SessionRecorder(log_path)
+    recorder.command(4212, "play", 0.0, 0.01)
+    recorder.position(4212, 5, 0.5)
+    recorder.close()
+    with open(log_path, "rb") as f:
+        data = f.read()
+    with open(log_path, "wb") as f:
+        f.write(data[:-2])
+
+    _, records = read_log(log_path)
+    assert records == [CommandRecord(0.0, 4212, 0.01, "play")]
+
+
+def test_broadcast_spreads_skip_lifecycle_records():
+    records = [
+        CommandRecord(1.0, 4212, 1.01, "quit"),
+        LifecycleRecord(1.02, 4212, telemetry.EVENT_QUIT_SENT, 100),
+        CommandRecord(1.03, 4213, 1.05, "quit"),
+        LifecycleRecord(1.06, 4213, telemetry.EVENT_QUIT_SENT, 101),
+    ]
+    spreads = telemetry.broadcast_spreads(records)
+    assert len(spreads) == 1
+    t, command, spread, failed = spreads[0]
+    assert (t, command, failed) == (1.0, "quit", [])
+    assert abs(spread - 50) < 1e-6
+
+
+def test_broadcast_spreads_report_failed_instances():
+    records = [
+        CommandRecord(2.0, 4212, 2.01, "seek 30"),
+        CommandRecord(2.01, 4213, None, "seek 30"),
+        CommandRecord(2.02, 4214, 2.03, "seek 30"),
+    ]
+    spreads = telemetry.broadcast_spreads(records)
+    assert len(spreads) == 1
+    t, command, spread, failed = spreads[0]
+    assert (t, command, failed) == (2.0, "seek 30", [4213])
+    assert abs(spread - 30) < 1e-6
+
+
+def test_windowed_drift_resolves_sub_second_offset():
+    records = [CommandRecord(0.0, 4212, 0.01, "play"), CommandRecord(0.01, 4213, 0.02, "play")]
+    rng = random.Random(1)
+    t = 1.0
+    for _ in range(120):
+        t += rng.uniform(0.5, 1.5)
+        records.append(PositionRecord(t, 4212, int(t)))
+        records.append(PositionRecord(t + 0.002, 4213, int(t + 0.002 - 0.5)))
+
+    curve = telemetry.drift_curves(records)[4213]
+    assert {round(drift) for _, drift in curve} == {0, -1}
+    windows = telemetry.windowed_drift(curve)
+    assert len(windows) >= 3
+    for _, mean, _ in windows:
+        assert abs(mean - -0.5) < 0.1
+
+
+def test_position_sampler_records_exits(tmp_path):
+    log_path = str(tmp_path / "session.mtl")
+    recorder = SessionRecorder(log_path)
+    process = subprocess.Popen([sys.executable, "-c", "import sys; sys.exit(3)"])
+    process.wait()
+    sampler = telemetry.PositionSampler(recorder, "localhost", [], {4213: process})
+    sampler.check_exits()
+    sampler.check_exits()
+    recorder.close()
+
+    _, records = read_log(log_path)
+    assert [(r.port, r.event, r.pid, r.code) for r in records] == [
+        (4213, telemetry.EVENT_EXIT, process.pid, 3)]
+
+
+def test_recorder_refuses_existing_log(tmp_path):
+    log_path = str(tmp_path / "session.mtl")
+    SessionRecorder(log_path).close()
+    with pytest.raises(FileExistsError):
+        SessionRecorder(log_path)
+
+
+def test_recorder_reports_writer_failure_on_close(tmp_path):
+    log_path = str(tmp_path / "session.mtl")
+    recorder = SessionRecorder(log_path)
+    recorder.command(4212, "play", 0.0, 0.01)
+    recorder.command(4212, "x" * 70000, 0.1, 0.11)
+    recorder._thread.join(timeout=1)
+    assert not recorder._thread.is_alive()
+    recorder.position(4212, 5, 0.5)
+    assert recorder._queue.empty()
+
+    with pytest.raises(struct.error):
+        recorder.close()
+
+
+def test_resource_records_round_trip(tmp_path):
+    log_path = str(tmp_path / "session.mtl")
+    recorder = SessionRecorder(log_path)
+    recorder.resource(4212, 150 * 2 ** 20, 12.5)
+    recorder.resource(4212, 170 * 2 ** 20, 14.5)
+    recorder.resource(4213, 40 * 2 ** 20, 2.0)
+    recorder.close()
+
+    _, records = read_log(log_path)
+    assert [(r.port, r.rss, r.cpu) for r in records] == [
+        (4212, 150 * 2 ** 20, 12.5), (4212, 170 * 2 ** 20, 14.5), (4213, 40 * 2 ** 20, 2.0)]
+    assert all(isinstance(r, ResourceRecord) for r in records)
+
+    stats = telemetry.resource_stats(records)
+    assert stats == {
+        4212: {"samples": 2, "rss_avg": 160 * 2 ** 20, "rss_peak": 170 * 2 ** 20, "cpu_avg": 13.5},
+        4213: {"samples": 1, "rss_avg": 40 * 2 ** 20, "rss_peak": 40 * 2 ** 20, "cpu_avg": 2.0},
+    }